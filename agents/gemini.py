@@ -0,0 +1,24 @@
+"""Process-wide Gemini client.
+
+Every engine instance used to build its own genai.Client, which meant a
+fresh HTTP pool (TCP + TLS handshakes) per session in anything that
+creates engines per request. One shared client keeps connections warm and
+validates GOOGLE_API_KEY exactly once.
+"""
+
+import os
+from functools import lru_cache
+
+from google import genai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@lru_cache(maxsize=None)
+def get_client() -> genai.Client:
+    """Returns the shared Gemini client, creating it on first use."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY not found. Please set it in your .env file.")
+    return genai.Client(api_key=api_key)
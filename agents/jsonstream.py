@@ -0,0 +1,80 @@
+"""Incremental parsing of streamed Gemini JSON responses.
+
+The model replies with {"results": [ {...}, {...} ]}. When the response is
+streamed, waiting for the closing brace wastes the whole decode time before
+the user sees anything. ResultStreamParser is fed text chunks as they
+arrive and yields each dish object the moment its closing brace shows up,
+so callers can render results progressively.
+"""
+
+from typing import Dict, List
+
+from agents.jsonutil import json_loads
+
+
+class ResultStreamParser:
+    """Extracts completed objects from the "results" array of a JSON stream."""
+
+    def __init__(self, array_key: str = "results"):
+        self._marker = f'"{array_key}"'
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._in_string = False
+        self._escape = False
+        self._depth = 0
+        self._object_start = -1
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consume a text chunk; return any dish objects completed by it."""
+        completed: List[Dict] = []
+        # Once the results array has closed, trailing fields of the outer
+        # object must not be mistaken for dishes.
+        if self.done:
+            return completed
+        self._buffer += chunk
+
+        if not self._in_array:
+            marker_index = self._buffer.find(self._marker)
+            if marker_index == -1:
+                return completed
+            bracket_index = self._buffer.find('[', marker_index)
+            if bracket_index == -1:
+                return completed
+            self._in_array = True
+            self._pos = bracket_index + 1
+
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._object_start = i
+                self._depth += 1
+            elif char == '}':
+                # A close brace at depth 0 belongs to the outer object, not
+                # to a dish — never let the counter go negative.
+                if self._depth > 0:
+                    self._depth -= 1
+                    if self._depth == 0 and self._object_start >= 0:
+                        completed.append(json_loads(buffer[self._object_start:i + 1]))
+                        self._object_start = -1
+            elif char == ']' and self._depth == 0:
+                self.done = True
+                i += 1
+                break
+            i += 1
+
+        self._pos = i
+        return completed
@@ -0,0 +1,29 @@
+"""Shared JSON helpers.
+
+Uses orjson (Rust implementation, several times faster on both encode and
+decode) when it is installed, and silently falls back to the stdlib json
+module so nothing extra is required to run the agents.
+"""
+
+import json
+
+try:
+    import orjson
+
+    def json_loads(data):
+        """Parse a JSON string/bytes into Python objects."""
+        return orjson.loads(data)
+
+    def json_dumps(obj) -> str:
+        """Serialize Python objects to a JSON string (UTF-8, non-ASCII kept)."""
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+
+    def json_loads(data):
+        """Parse a JSON string/bytes into Python objects."""
+        return json.loads(data)
+
+    def json_dumps(obj) -> str:
+        """Serialize Python objects to a JSON string (UTF-8, non-ASCII kept)."""
+        return json.dumps(obj, ensure_ascii=False)
@@ -0,0 +1,80 @@
+"""Local retrieval over the restaurant catalog.
+
+Instead of pasting every restaurant into each Gemini prompt, the engines
+build a DishIndex once at load time and inject only the top-K dishes that
+actually match the query. Matching is a token-overlap score over dish
+names, descriptions, ingredients, and tags (works for Georgian script the
+same as Latin), so retrieval costs microseconds and needs no extra models.
+"""
+
+import re
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, List, Set
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokenize(text: str) -> Set[str]:
+    return {token.casefold() for token in _TOKEN_RE.findall(text)}
+
+
+class DishIndex:
+    """Flattened, token-indexed view of the nested restaurant JSON."""
+
+    def __init__(self, restaurant_data: List[Dict[str, Any]]):
+        self.dishes: List[Dict[str, Any]] = []
+        # Prices kept as a parallel C-double array: numeric filters scan
+        # contiguous memory instead of chasing a dict lookup per dish.
+        self.prices: array = array('d')
+        self._token_index: Dict[str, Set[int]] = defaultdict(set)
+
+        for restaurant in restaurant_data:
+            for dish in restaurant.get('dishes', []):
+                index = len(self.dishes)
+                record = {
+                    "restaurant_id": restaurant.get("id", ""),
+                    "restaurant_name": restaurant.get("name", ""),
+                    "dish_id": dish.get("id", ""),
+                    "dish_name": dish.get("name", ""),
+                    "description": dish.get("description", ""),
+                    "price": dish.get("price", 0.0),
+                    "ingredients": dish.get("ingredients", []),
+                    "tags": dish.get("tags", []),
+                    "allergens": dish.get("allergens", []),
+                }
+                self.dishes.append(record)
+                self.prices.append(float(record["price"] or 0.0))
+
+                searchable = " ".join((
+                    record["restaurant_name"],
+                    record["dish_name"],
+                    record["description"],
+                    " ".join(record["ingredients"]),
+                    " ".join(record["tags"]),
+                ))
+                for token in _tokenize(searchable):
+                    self._token_index[token].add(index)
+
+    def __len__(self) -> int:
+        return len(self.dishes)
+
+    def top_k(self, query: str, k: int = 30, max_price: float = 0.0) -> List[Dict[str, Any]]:
+        """Return the k dishes sharing the most tokens with the query.
+
+        A non-zero max_price drops dearer dishes before ranking, using the
+        parallel price array. Returns an empty list when nothing matches,
+        so callers can fall back to the full catalog.
+        """
+        scores: Dict[int, int] = defaultdict(int)
+        for token in _tokenize(query):
+            for index in self._token_index.get(token, ()):
+                scores[index] += 1
+
+        items = scores.items()
+        if max_price:
+            prices = self.prices
+            items = [(index, score) for index, score in items if prices[index] <= max_price]
+
+        ranked = sorted(items, key=lambda item: -item[1])[:k]
+        return [self.dishes[index] for index, _ in ranked]
@@ -0,0 +1,40 @@
+"""Retry helper for transient Gemini failures.
+
+Rate limits (429) and server-side 5xx errors are the common failure mode
+for hosted LLM calls and are almost always recoverable; surfacing them to
+the user as instant errors wastes the whole request. retry_async hides
+them behind exponential backoff with jitter while letting permanent
+errors (bad arguments, auth) fail immediately.
+"""
+
+import asyncio
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+_RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+def _is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in _RETRYABLE_CODES:
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+async def retry_async(func, *args, attempts: int = 5, initial_delay: float = 0.5, max_delay: float = 8.0, **kwargs):
+    """Call an async function, retrying transient failures with backoff."""
+    delay = initial_delay
+    for attempt in range(1, attempts + 1):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as error:
+            if attempt == attempts or not _is_retryable(error):
+                raise
+            logger.warning(
+                "Gemini call failed (attempt %d/%d): %s — retrying in %.1fs",
+                attempt, attempts, error, delay
+            )
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, max_delay)
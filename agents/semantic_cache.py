@@ -0,0 +1,62 @@
+"""Semantic response cache for the search engines.
+
+Near-duplicate queries ("best khachapuri" / "top khachapuri") don't need a
+fresh model round trip when an answer was just produced at low temperature.
+Queries are reduced to casefolded token sets and compared with Jaccard
+similarity — no embedding model or vector index required, so the cache adds
+no dependencies and costs microseconds per lookup.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class SemanticCache:
+    """Caches responses keyed on query similarity plus an exact context key."""
+
+    def __init__(self, threshold: float = 0.9, max_entries: int = 256):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # (query tokens, context key, cached response)
+        self._entries: List[Tuple[frozenset, str, Dict[str, Any]]] = []
+
+    @staticmethod
+    def _tokenize(query: str) -> frozenset:
+        return frozenset(_TOKEN_RE.findall(query.casefold()))
+
+    def get(self, query: str, context_key: str = "") -> Optional[Dict[str, Any]]:
+        """Return a cached response for a similar-enough query, or None."""
+        tokens = self._tokenize(query)
+        if not tokens:
+            return None
+
+        best_response = None
+        best_similarity = 0.0
+        for entry_tokens, entry_context, response in self._entries:
+            if entry_context != context_key:
+                continue
+            union = len(tokens | entry_tokens)
+            if not union:
+                continue
+            similarity = len(tokens & entry_tokens) / union
+            if similarity > best_similarity:
+                best_similarity = similarity
+                best_response = response
+
+        if best_similarity >= self.threshold:
+            return best_response
+        return None
+
+    def put(self, query: str, response: Dict[str, Any], context_key: str = "") -> None:
+        """Store a response for future similarity hits."""
+        tokens = self._tokenize(query)
+        if not tokens:
+            return
+        if len(self._entries) >= self.max_entries:
+            self._entries.pop(0)
+        self._entries.append((tokens, context_key, response))
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -1,31 +1,165 @@
 import os
-import json
 import asyncio
+import hashlib
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+from string import Template
 from typing import Dict, List, Any
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
+from agents.gemini import get_client
+from agents.jsonstream import ResultStreamParser
+from agents.jsonutil import json_dumps, json_loads
+from agents.retrieval import DishIndex
+from agents.retry import retry_async
+from agents.semantic_cache import SemanticCache
+
 # --- Configuration ---
 load_dotenv()
 
+# Prompt templates, parsed once at import time. Per-call assembly is then a
+# single substitute() over the small dynamic holes instead of re-building a
+# multi-KB f-string whose bulk never changes.
+_IMAGE_PROMPT = Template("""
+        Analyze this food image and find similar dishes in the restaurant database.
+        Additional user query: "${query}" if query else "None"
+        Return up to ${limit} matches.
+        """)
+
+_TEXT_PROMPT = Template("""
+        You are a Georgian cuisine expert. Find dishes matching the query: "${query}"
+        Return up to ${limit} matches.
+        """)
+
+_PREFERENCES_PROMPT = Template("""
+        User Preferences and allergies: "${preferences}"
+        """)
+
+_TOOL_SEARCH_PROMPT = Template("""
+        You are a Georgian cuisine expert and waiter.
+        Find dishes matching the query: "${query}"
+        User preferences and allergies: "${preferences}"
+
+        Use the search_dishes tool to look up candidate dishes in the
+        restaurant catalog; call it again with refined terms if the first
+        results don't satisfy the query. Return up to ${limit} matches.
+
+        OUTPUT FORMAT (JSON ONLY):
+        {
+            "results": [
+                {
+                    "restaurant_id": "...",
+                    "restaurant_name": "...",
+                    "dish_name": "...",
+                    "dish_price": 0.00,
+                }
+            ]
+        }
+        """)
+
+_SEARCH_PROMPT_BODY = Template("""
+        ${prompt}
+
+        RESTAURANT DATA:
+        ${restaurant_data_json}
+
+        INSTRUCTIONS:
+        1. Understand the user's intent (taste, price, dietary needs, cuisine type, etc.)
+        2. Find the most relevant dishes with detailed restaurant information
+        3. Return maximum ${limit} results ranked by relevance
+        4. Focus on Georgian cuisine authenticity when relevant
+        5. Always focus on user preferences and allergies, they are top priority.
+        User Preferences are: ${preferences_prompt}
+
+        also you should act like the waiters in the restaurant,
+        professionally and politely pick the best dishes that user might also like
+        and return them with the addition to the main query.
+        focus on preferences and allergies user specified in the query.
+
+        you are not allowed to return the same dish more than once.
+        and you are not allowed to make mistakes in the data when returning them. you have IDEAL memory and ideal capabilities to return information as it was.
+
+        OUTPUT FORMAT (JSON ONLY):
+        {
+            "results": [
+                {
+                    "restaurant_id": "...",
+                    "restaurant_name": "...",
+                    "dish_name": "...",
+                    "dish_price": 0.00,
+                }
+            ]
+        }
+        """)
+
 class SupraSearchEngine:
     """Universal S.U.P.R.A. agent for multimodal restaurant search."""
-    
-    def __init__(self, model: str = "gemini-1.5-flash"):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY not found. Please set it in your .env file.")
-        
-        self.client = genai.Client(api_key=self.api_key)
-        self.model = self.model = "gemini-2.0-flash"
+
+    # Shared across instances: caps in-flight Gemini calls so bursts of
+    # concurrent searches don't blow past the API rate limit and trigger
+    # slower-than-serial 429 retries.
+    _gemini_semaphore = asyncio.Semaphore(int(os.getenv("SUPRA_MAX_CONCURRENCY", "16")))
+
+    def __init__(self, model: str = "gemini-2.0-flash"):
+        self.client = get_client()
+        self.model = model
         self.restaurant_data = []
+        self._restaurant_data_json = "[]"
+        self._dish_index = None
+        # Safe at temperature 0.1: near-identical queries get the cached answer.
+        self._semantic_cache = SemanticCache()
+        # Byte-identical repeats (page reloads, retries) skip inference entirely.
+        self._exact_cache: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._exact_cache_size = 1024
+        self._image_part_cache: Dict[bytes, types.Part] = {}
+
+    @staticmethod
+    def _exact_cache_key(query: str, image_data: bytes, preferences: str, limit: int) -> str:
+        """Fingerprint of everything that can change a search response."""
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(query.encode())
+        hasher.update(preferences.encode())
+        hasher.update(str(limit).encode())
+        if image_data:
+            hasher.update(image_data)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _load_parsed(data_path: str):
+        """Loads the parsed catalog through a pickle cache keyed on the
+        source file's mtime/size, so warm restarts skip the JSON parse."""
+        source = Path(data_path)
+        stat = source.stat()
+        fingerprint = hashlib.blake2b(
+            f"{source.resolve()}:{stat.st_mtime_ns}:{stat.st_size}".encode(),
+            digest_size=16
+        ).hexdigest()
+        cache_path = source.parent / ".cache" / f"{source.stem}-{fingerprint}.pkl"
+
+        if cache_path.exists():
+            with open(cache_path, 'rb') as cache_file:
+                return pickle.load(cache_file)
+
+        with open(source, 'rb') as file:
+            data = json_loads(file.read())
+        try:
+            cache_path.parent.mkdir(exist_ok=True)
+            with open(cache_path, 'wb') as cache_file:
+                pickle.dump(data, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass  # read-only data dir — just skip the cache
+        return data
 
     def load_data(self, data_path: str = "data/rests.json"):
         """Loads restaurant data from a JSON file."""
         try:
-            with open(data_path, 'r', encoding='utf-8') as file:
-                self.restaurant_data = json.load(file)
+            self.restaurant_data = self._load_parsed(data_path)
+            # Serialize once here so every search reuses the same string
+            # instead of re-encoding the whole catalog per request.
+            self._restaurant_data_json = json_dumps(self.restaurant_data)
+            self._dish_index = DishIndex(self.restaurant_data)
             print(f"✅ Successfully loaded {len(self.restaurant_data)} restaurants.")
             return True
         except Exception as e:
@@ -40,90 +174,210 @@ class SupraSearchEngine:
     #         reverse=True
     #     )[:limit]
         
-    def _process_image(self, image_path: str) -> types.Part:
+    async def _process_image(self, image_path: str) -> types.Part:
         """Helper to read and prepare an image file for the API."""
-        return types.Part.from_uri(
-            uri=image_path,
-            mime_type='image/jpeg' # Let the API handle detection
-        )
-        
+        # Read in a thread so disk I/O never blocks the event loop.
+        image_data = await asyncio.to_thread(self._read_file_bytes, image_path)
+        return self._part_from_bytes(image_data)
+
+    def _part_from_bytes(self, image_data: bytes) -> types.Part:
+        """Prepare (or reuse) the API Part for already-read image bytes.
+
+        Cached by content hash — users often reuse the same photo."""
+        digest = hashlib.blake2b(image_data, digest_size=16).digest()
+        part = self._image_part_cache.get(digest)
+        if part is None:
+            part = types.Part.from_bytes(
+                data=image_data,
+                mime_type='image/jpeg'
+            )
+            self._image_part_cache[digest] = part
+        return part
+
+    @staticmethod
+    def _read_file_bytes(path: str) -> bytes:
+        with open(path, 'rb') as file:
+            return file.read()
+
+
     async def search(self, query: str = "", image_path: str = "", preferences: str = "", limit: int = 10) -> Dict[str, Any]:
         """
         Performs a multimodal search using either text, an image, or both.
         """
-        prompt = ""
-        contents = []
+        # Read the image once, off the event loop: the same bytes feed both
+        # the cache-key hash and the prepared Part, instead of a blocking
+        # read here and a second read in _process_image.
+        image_data = b""
+        if image_path:
+            try:
+                image_data = await asyncio.to_thread(self._read_file_bytes, image_path)
+            except OSError:
+                image_data = b""
+        exact_key = None
+        if image_data or not image_path:
+            exact_key = self._exact_cache_key(query, image_data, preferences, limit)
+        if exact_key is not None and exact_key in self._exact_cache:
+            self._exact_cache.move_to_end(exact_key)
+            return self._exact_cache[exact_key]
+
+        cache_context = f"{preferences}|{limit}|{image_path}"
+        cached = self._semantic_cache.get(query, cache_context)
+        if cached is not None:
+            return cached
 
         try:
-            restaurant_data_json = json.dumps(self.restaurant_data, ensure_ascii=False)
-            
-            if image_path:
-                image_part = self._process_image(image_path)
-                contents.append(image_part)
-                prompt = f"""
-                Analyze this food image and find similar dishes in the restaurant database.
-                Additional user query: "{query}" if query else "None"
-                Return up to {limit} matches.
-                """
-            else:
-                prompt = f"""
-                You are a Georgian cuisine expert. Find dishes matching the query: "{query}"
-                Return up to {limit} matches.
-                """
-
-            if preferences:
-                preferences_prompt = f"""
-                User Preferences and allergies: "{preferences}"
-                """
-
-            full_prompt = f"""
-            {prompt}
-            
-            RESTAURANT DATA:
-            {restaurant_data_json}
-
-            INSTRUCTIONS:
-            1. Understand the user's intent (taste, price, dietary needs, cuisine type, etc.)
-            2. Find the most relevant dishes with detailed restaurant information
-            3. Return maximum {limit} results ranked by relevance
-            4. Focus on Georgian cuisine authenticity when relevant
-            5. Always focus on user preferences and allergies, they are top priority.
-            User Preferences are: {preferences_prompt}
-
-            also you should act like the waiters in the restaurant,
-            professionally and politely pick the best dishes that user might also like
-            and return them with the addition to the main query.
-            focus on preferences and allergies user specified in the query.
-
-            you are not allowed to return the same dish more than once.
-            and you are not allowed to make mistakes in the data when returning them. you have IDEAL memory and ideal capabilities to return information as it was.
-
-            OUTPUT FORMAT (JSON ONLY):
-            {{
-                "results": [
-                    {{
-                        "restaurant_id": "...",
-                        "restaurant_name": "...",
-                        "dish_name": "...",
-                        "dish_price": 0.00,
-                    }}
-                ]
-            }}
-            """
-            contents.append(full_prompt)
-
-            response = self.client.models.generate_content(
-                model = self.model,
+            contents = await self._build_search_contents(query, image_path, preferences, limit, image_data)
+
+            async with self._gemini_semaphore:
+                response = await retry_async(
+                    self.client.aio.models.generate_content,
+                    model=self.model,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                            response_mime_type="application/json",
+                            temperature=0.1
+                    )
+                )
+
+            result = {"status": "success", "data": json_loads(response.text)}
+            self._semantic_cache.put(query, result, cache_context)
+            if exact_key is not None:
+                self._exact_cache[exact_key] = result
+                if len(self._exact_cache) > self._exact_cache_size:
+                    self._exact_cache.popitem(last=False)
+            return result
+
+        except Exception as e:
+            print(f"❌ Search failed: {e}")
+            return {"status": "error", "message": str(e)}
+
+    async def search_stream(self, query: str = "", image_path: str = "", preferences: str = "", limit: int = 10):
+        """
+        Streaming variant of search: yields dish dicts as Gemini produces
+        them, so the first result shows up well before the response ends.
+        """
+        contents = await self._build_search_contents(query, image_path, preferences, limit)
+        parser = ResultStreamParser()
+
+        async with self._gemini_semaphore:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model,
                 contents=contents,
                 config=types.GenerateContentConfig(
                         response_mime_type="application/json",
                         temperature=0.1
                 )
             )
-            
-            return {"status": "success", "data": json.loads(response.text)}
+            async for chunk in stream:
+                if chunk.text:
+                    for dish in parser.feed(chunk.text):
+                        yield dish
+
+    async def _build_search_contents(self, query: str, image_path: str, preferences: str, limit: int, image_data: bytes = b"") -> List[Any]:
+        """Assembles the prompt parts shared by search and search_stream."""
+        prompt = ""
+        contents = []
+
+        # The image bytes may already be in hand from the cache-key read;
+        # only go back to disk when they aren't (the streaming path), kicking
+        # the read off first so the disk I/O overlaps with the local
+        # retrieval work below instead of running after it.
+        image_task = None
+        if image_path and not image_data:
+            image_task = asyncio.create_task(self._process_image(image_path))
+
+        restaurant_data_json = self._restaurant_data_json
+        # Retrieval-augmented prompting: inject only the dishes relevant
+        # to the query instead of the whole catalog. Image-only searches
+        # keep the full catalog since there is no text to retrieve on.
+        if query and self._dish_index is not None:
+            candidates = self._dish_index.top_k(query, k=max(30, limit * 3))
+            if len(candidates) >= limit:
+                restaurant_data_json = json_dumps(candidates)
+
+        if image_data:
+            contents.append(self._part_from_bytes(image_data))
+            prompt = _IMAGE_PROMPT.substitute(query=query, limit=limit)
+        elif image_task is not None:
+            contents.append(await image_task)
+            prompt = _IMAGE_PROMPT.substitute(query=query, limit=limit)
+        else:
+            prompt = _TEXT_PROMPT.substitute(query=query, limit=limit)
+
+        preferences_prompt = _PREFERENCES_PROMPT.substitute(preferences=preferences) if preferences else "None"
+
+        full_prompt = _SEARCH_PROMPT_BODY.substitute(
+            prompt=prompt,
+            restaurant_data_json=restaurant_data_json,
+            limit=limit,
+            preferences_prompt=preferences_prompt,
+        )
+        contents.append(full_prompt)
+        return contents
+
+    def _search_dishes_tool(self, query: str, max_price: float = 0.0) -> List[Dict[str, Any]]:
+        """Local handler behind the search_dishes function tool."""
+        if self._dish_index is None:
+            return []
+        return self._dish_index.top_k(query, k=30, max_price=max_price)
+
+    async def search_with_tools(self, query: str, preferences: str = "", limit: int = 10) -> Dict[str, Any]:
+        """
+        Tool-driven search: instead of reading the catalog from the prompt,
+        the model calls search_dishes against the local index and only ever
+        sees the dishes it asked for. Keeps prompts tiny on large catalogs.
+        """
+        search_tool = types.Tool(function_declarations=[
+            types.FunctionDeclaration(
+                name="search_dishes",
+                description="Search the restaurant catalog for dishes matching a text query, optionally capped by price.",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "query": {"type": "string"},
+                        "max_price": {"type": "number"},
+                    },
+                    "required": ["query"],
+                },
+            )
+        ])
+
+        contents: List[Any] = [_TOOL_SEARCH_PROMPT.substitute(
+            query=query, limit=limit, preferences=preferences or "None"
+        )]
+        config = types.GenerateContentConfig(temperature=0.1, tools=[search_tool])
+
+        try:
+            response = None
+            for _ in range(4):  # tool-call round trips before we give up
+                async with self._gemini_semaphore:
+                    response = await retry_async(
+                        self.client.aio.models.generate_content,
+                        model=self.model,
+                        contents=contents,
+                        config=config
+                    )
+                function_calls = response.function_calls
+                if not function_calls:
+                    break
+                contents.append(response.candidates[0].content)
+                for call in function_calls:
+                    dishes = self._search_dishes_tool(**(call.args or {}))
+                    contents.append(types.Part.from_function_response(
+                        name=call.name,
+                        response={"dishes": dishes}
+                    ))
+
+            return {"status": "success", "data": json_loads(response.text)}
 
         except Exception as e:
-            print(f"❌ Search failed: {e}")
+            print(f"❌ Tool search failed: {e}")
             return {"status": "error", "message": str(e)}
 
+    async def search_many(self, queries: List[str], preferences: str = "", limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Runs several searches concurrently so network/model latency overlaps.
+        """
+        tasks = [self.search(query=query, preferences=preferences, limit=limit) for query in queries]
+        return list(await asyncio.gather(*tasks))
+
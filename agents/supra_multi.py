@@ -1,108 +1,514 @@
 import os
+import re
 import json
 import asyncio
-from typing import Dict, List, Any, Optional
-from google import genai
+import hashlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from string import Template
+from typing import Dict, List, Any, Optional, TypedDict
 from google.genai import types
 from dotenv import load_dotenv
 
+from agents.gemini import get_client
+from agents.jsonstream import ResultStreamParser
+from agents.jsonutil import json_dumps, json_loads
+from agents.retrieval import DishIndex
+from agents.retry import retry_async
+from agents.semantic_cache import SemanticCache
+
 # --- Configuration ---
 load_dotenv()
 
+_SATISFACTION_INDICATORS = (
+    "perfect, thank you", "that's perfect", "perfect thanks",
+    "i'm satisfied", "that's all", "i'm done", "that's enough",
+    "order these", "i'll order these", "book these"
+)
+# One compiled alternation means a single C-level scan per message instead
+# of one Python substring search per indicator. Word boundaries keep
+# phrases like "order these" from matching inside other words.
+_SATISFACTION_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(p) for p in _SATISFACTION_INDICATORS) + r")\b"
+)
+# Single-word sign-offs that mean "we're done" only when they are the whole
+# message — hash lookup, no regex scan needed.
+_EXACT_SATISFY = frozenset({"perfect", "done", "finished", "enough", "thanks", "thank you"})
+
+# The instruction body is constant across turns; building the prompt is a
+# single Template.substitute over the dynamic slots instead of re-evaluating
+# a screenful of f-string conditionals every call.
+_IMAGE_MODE_BLOCK = """🖼️ IMAGE ANALYSIS MODE:
+- First, analyze the food image to identify what dish/cuisine it shows
+- Then, search the restaurant database for ACTUAL similar dishes
+- Return matching dishes from the database, not just description
+- Focus on finding real dishes that match what you see in the image
+"""
+
+# The prompt is split so everything that is byte-identical across turns
+# (role, instructions, examples) comes first and the per-turn material
+# trails it — a stable prefix is what lets server-side prompt caching
+# actually hit.
+_CHAT_STATIC = Template("""\
+You are a professional Georgian cuisine expert and waiter with PERFECT MEMORY.
+
+INSTRUCTIONS - Handle ALL operations naturally:
+
+1. UNDERSTAND the user's intent:
+   - Adding dishes? ("add", "also", "more", "suggest")
+   - Removing/filtering? ("only", "just", "don't want", "remove", "except")
+   - Replacing? ("instead", "different")
+   - Asking for information? ("show", "what do I have")
+   - Image search? (when image provided, find similar dishes in database)
+
+2. HANDLE USER SELECTION DECISIONS:
+    - If user says "ავიღებ X" or "X ავიღებ" (I'll take X) = choose ONLY X, remove other similar options
+   - If user wants to ADD: keep current dishes + add new ones = - ALWAYS keep dishes user has already chosen (unless they specifically ask to remove)
+   - If user asks for new category: show ALL options in that category + keep existing selection
+   - If user says "I don't want X": remove X from current selection - Only remove items when user explicitly says "remove X" or "I don't want X"
+   - If user has allergies: remove/avoid allergens
+   - If IMAGE PROVIDED: search database for dishes similar to what's shown
+   - If user chooses 1 item from multiple options (like "საქონლის ხინკალს" from 4 khinkali)
+    - Keep the chosen item + remove other similar items from same category
+
+3. SHOW ALL AVAILABLE OPTIONS for what user requests - and after filtering RETURN FINAL COMPLETE SELECTION
+   - If user asks for khinkali, show ALL khinkali options available
+   - If user asks for drinks, show ALL drink options available
+   - If user asks for meat dishes, show ALL meat dish options
+   - Don't make filtering decisions for the user - show options
+   - Only filter when user explicitly says "remove X" or "only keep Y"
+   - Maximum $limit dishes total
+   - NEVER add duplicates - always check! if exact same dish already exists in selection
+    - If user selects existing dish, just keep that one, don't add again
+   - Respect allergies and preferences
+   - For images: MUST include actual matching dishes from database
+
+4. BE SMART about context:
+   - "only khinkali" = keep only khinkali dishes from current selection
+   - "I have pork allergy" = remove all pork dishes
+   - "add drinks" = add drinks to existing selection
+   - "remove everything except beef khinkali" = keep only beef khinkali
+   - IMAGE + "What food is this?" = identify AND find similar dishes in database
+   - if requested dish is not in the database and you can't find similar dishes, leave blank space for that dish
+
+CRITICAL SELECTION RULES:
+    - "ხინკალი მინდა" = show ALL khinkali options (exploration phase)
+    - "საქონლის ხინკალს ავიღებ" = choose ONLY beef khinkali, REMOVE all other khinkali (selection phase)
+    - "დავამატებ X" = choose X from shown options, remove other similar items
+    - "ავიღებ X" = same as above - selection, not addition
+
+    NEVER keep multiple items of same type after user makes a choice.
+
+GEORGIAN LANGUAGE CONTEXT:
+    - "ხინკალი მინდა" = "I want khinkali" → Show options
+    - "ავიღებ ხინკალს" = "I'll take THE khinkali" → Use current selection
+    - When user says "ავიღებ X და Y" after discussing specific items → finalize those specific items, don't show all options again
+
+5. CRITICAL FOR IMAGES:
+   - Don't just describe the food - FIND MATCHING DISHES in the database
+   - Look for dishes with similar ingredients, cooking methods, or cuisine type
+   - Return actual available dishes, not descriptions
+
+<example>
+EXAMPLE CONVERSATION TO FOLLOW:
+    User: "აჭარული ხაჭაპური მინდა" (I want Adjarian khachapuri)
+    → Show ALL available აჭარული ხაჭაპური options from all restaurants
+
+    User: "სახლი 11-ს აჭარული ავიღებ" (I'll take Adjarian from Sakhli #11)
+    → Keep that specific khachapuri remove other khachapuri options
+
+    User: "სასმელიც" (also drinks)
+    → Keep the khachapuri selection + show ALL available drink options from the same restaurant user chose
+
+    User: "რამე ხორციანსაც" (something with meat too)
+    → Keep khachapuri from same restaurant + keep drinks + show ALL meat dish options
+
+    User: "აღარ მინდა სასმელი" (I don't want drinks)
+    → Keep khachapuri + remove drinks + show ALL meat dish options
+
+    User: "ვსო შევუკვეთავ" (I'll order these)
+    → Keep khachapuri + keep meat dishes + show final selection
+
+    This way user sees all options and makes their own filtering decisions.
+</example>
+
+<example 2>
+    User: "ხინკალი მინდა" (I want khinkali)
+    → Show ALL 5 khinkali options
+
+    User: "საქონლის ხინკალს ავიღებ" (I'll take beef khinkali)
+    → Keep ONLY "ხინკალი (საქონლის, 1 ცალი)" - remove other 4 khinkali options
+    → Final selection: 1 dish (the chosen beef khinkali)
+
+    User: "სასმელიც დავამატებ" (I'll also add drinks)
+    → Keep beef khinkali + show ALL drink options
+</example 2>
+
+Set "operation_performed" to one of: "added", "filtered", "replaced", "removed", "no_change".
+Set "conversation_state" to "satisfied" when the user indicates the order is final, otherwise "refining" or "exploring".
+""")
+
+_CHAT_DYNAMIC = Template("""\
+$image_block$conversation_context
+USER REQUEST: "$query"
+
+CURRENT USER SELECTION (what they have now, one dish per line as restaurant_name|dish_name|price):
+$current_selection
+
+$restaurant_block
+""")
+
+_BATCH_PROMPT = Template("""\
+You are a professional Georgian cuisine expert and waiter.
+
+$restaurant_block
+
+Below are several INDEPENDENT user requests. Answer each one separately
+using only dishes from the restaurant data. Maximum $limit dishes per request.
+
+REQUESTS (JSON list of {"id", "query"}):
+$requests_block
+
+Return ONLY a JSON list with one object per request:
+[{"id": "...", "results": [{"restaurant_id": "...", "restaurant_name": "...", "dish_name": "...", "dish_price": 0.0}]}]
+""")
+
+class DishResult(TypedDict):
+    restaurant_id: str
+    restaurant_name: str
+    dish_name: str
+    dish_price: float
+
+
+class SearchResponse(TypedDict):
+    """Schema enforced server-side via response_schema — the model cannot
+    emit anything but this shape, so the prompt no longer has to spend
+    tokens describing the JSON format."""
+    results: List[DishResult]
+    operation_performed: str
+    conversation_state: str
+
+
+def _compact_lines(dishes: List[Dict[str, Any]]) -> str:
+    """Terse pipe-separated catalog lines for prompts.
+
+    The model only needs identity and price to build a selection; dropping
+    JSON braces, key names and secondary fields cuts the catalog's token
+    footprint roughly in half versus the raw JSON dump.
+    """
+    return "\n".join(
+        f"{d['restaurant_id']}|{d['restaurant_name']}|{d['dish_name']}|{d['price']}"
+        for d in dishes
+    )
+
+
+@lru_cache(maxsize=4)
+def _load_catalog(data_path: str, mtime_ns: int):
+    """Parse the catalog once per (path, mtime) for the whole process.
+
+    In a server that builds one engine per session, every instance was
+    re-reading and re-parsing the same rests.json; the memo keys on mtime
+    so an edited file still reloads. Callers treat the result as read-only.
+    """
+    with open(data_path, 'rb') as file:
+        raw = file.read()
+    data = json_loads(raw)
+    index = DishIndex(data)
+    return raw.decode('utf-8'), data, index, _compact_lines(index.dishes)
+
+
+def _dish_key(restaurant_name: str, dish_name: str) -> str:
+    """Stable identity of a dish across turns."""
+    return f"{restaurant_name}_{dish_name}"
+
+def _key_digest(key: str) -> bytes:
+    """8-byte fingerprint of a dish key for long-lived membership sets.
+
+    all_suggested_dishes only ever answers "seen before?", so it doesn't
+    need the full restaurant+dish strings — fixed 8-byte digests keep the
+    set's memory flat over long sessions, and 64 bits is collision-safe
+    within a single conversation.
+    """
+    return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+@dataclass(slots=True)
+class Msg:
+    """One history entry. Same slots rationale as Dish — the shape is
+    fixed, so a dict per message is wasted hash-table overhead."""
+    role: str
+    content: str
+    turn: int
+    count: int = 0
+
+
+@dataclass(slots=True)
+class Dish:
+    """One suggested dish. Slots cut per-object memory and make the
+    attribute access in the hot state loops cheaper than dict lookups."""
+    restaurant_id: str = ""
+    restaurant_name: str = ""
+    dish_name: str = ""
+    dish_price: float = 0.0
+    key: str = field(init=False, default="")
+    # Human-readable line for context prompts, formatted once at creation
+    # instead of per context build.
+    display: str = field(init=False, default="")
+
+    def __post_init__(self):
+        self.key = _dish_key(self.restaurant_name, self.dish_name)
+        self.display = f"{self.dish_name} from {self.restaurant_name} (${self.dish_price})"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Dish":
+        return cls(
+            restaurant_id=data.get("restaurant_id", ""),
+            restaurant_name=data.get("restaurant_name", ""),
+            dish_name=data.get("dish_name", ""),
+            dish_price=data.get("dish_price", 0.0) or 0.0,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "restaurant_id": self.restaurant_id,
+            "restaurant_name": self.restaurant_name,
+            "dish_name": self.dish_name,
+            "dish_price": self.dish_price,
+        }
+
 class ConversationState:
     """Simple conversation state management."""
-    
+
     def __init__(self):
-        self.conversation_history: List[Dict[str, Any]] = []
-        self.selected_dishes: List[Dict[str, Any]] = []  # Current selection
+        # Bounded ring buffer: the context prompt only ever reads the tail,
+        # so memory stays O(1) no matter how long the conversation runs.
+        self.conversation_history: deque = deque(maxlen=20)
+        # Current selection, keyed by dish key; dict order preserves the
+        # order dishes were suggested in.
+        self._cart: Dict[str, Dish] = {}
+        # Sets so per-dish membership checks stay O(1) as conversations grow.
+        self.excluded_dishes: set = set()
+        # Append-only history of everything ever suggested; holds 8-byte
+        # key digests, not the key strings themselves.
+        self.all_suggested_dishes: set = set()
         self.user_preferences: str = ""
         self.initial_query: str = ""
         self.turn_count: int = 0
         self.is_satisfied: bool = False
-        
+        # Running selection cost, maintained at mutation time so state
+        # reads never re-sum the cart.
+        self.total_cost: float = 0.0
+        # Serialized context, rebuilt only after a state mutation.
+        self._context_cache: Optional[str] = None
+
     def add_user_message(self, message: str):
         """Add a user message to conversation history."""
-        self.conversation_history.append({
-            "role": "user",
-            "content": message,
-            "turn": self.turn_count
-        })
-        
+        self._context_cache = None
+        self.conversation_history.append(Msg("user", message, self.turn_count))
+
+    @property
+    def selected_dishes(self) -> List[Dict[str, Any]]:
+        """Current selection as plain dicts (the external API shape)."""
+        return [dish.to_dict() for dish in self._cart.values()]
+
+    def selection_compact(self) -> str:
+        """Current selection as terse prompt lines.
+
+        The dishes are already in the catalog block, so the prompt only
+        needs their identity — names and price, no JSON keys or braces.
+        """
+        if not self._cart:
+            return "(empty)"
+        return "\n".join(
+            f"{dish.restaurant_name}|{dish.dish_name}|{dish.dish_price}"
+            for dish in self._cart.values()
+        )
+
+    def exclude_dish(self, restaurant_name: str, dish_name: str):
+        """Mark a dish as rejected so it is never suggested again."""
+        key = _dish_key(restaurant_name, dish_name)
+        self._context_cache = None
+        self.excluded_dishes.add(key)
+        dropped = self._cart.pop(key, None)
+        if dropped is not None:
+            self.total_cost -= dropped.dish_price
+
     def update_selected_dishes(self, new_dishes: List[Dict[str, Any]]):
         """Update selected dishes with new results from AI."""
-        self.selected_dishes = new_dishes
-        
-        # Add to conversation history
-        self.conversation_history.append({
-            "role": "assistant", 
-            "content": f"Updated selection to {len(new_dishes)} dishes",
-            "turn": self.turn_count
-        })
+        # The AI returns the full final selection each turn, so rebuild the
+        # cart in one pass — the dict key handles dedup, the excluded set
+        # keeps rejected dishes out.
+        self._context_cache = None
+        self._cart.clear()
+        self.total_cost = 0.0
+        for dish_data in new_dishes:
+            dish = dish_data if isinstance(dish_data, Dish) else Dish.from_dict(dish_data)
+            if dish.key in self._cart or dish.key in self.excluded_dishes:
+                continue
+            self.all_suggested_dishes.add(_key_digest(dish.key))
+            self._cart[dish.key] = dish
+            self.total_cost += dish.dish_price
+
+        # Record a turn pointer, not a cart snapshot — the cart itself only
+        # lives in selected_dishes.
+        self.conversation_history.append(Msg(
+            "assistant",
+            f"Updated selection to {len(self._cart)} dishes",
+            self.turn_count,
+            count=len(self._cart),
+        ))
             
     def get_conversation_context(self) -> str:
         """Get conversation context for AI."""
-        context = f"CONVERSATION TURN: {self.turn_count}\n"
-        context += f"USER PREFERENCES: {self.user_preferences}\n"
-        
-        if self.selected_dishes:
-            dishes_info = []
-            for i, dish in enumerate(self.selected_dishes, 1):
-                dishes_info.append(f"{i}. {dish['dish_name']} from {dish['restaurant_name']} (${dish['dish_price']})")
-            context += f"CURRENT SELECTION ({len(self.selected_dishes)} dishes):\n" + "\n".join(dishes_info) + "\n"
-        
+        # Mutations drop the cache; between them the serialized form is
+        # reused as-is. turn_count only moves together with a mutation.
+        if self._context_cache is not None:
+            return self._context_cache
+
+        # Accumulate lines and join once — no quadratic string rebuilding.
+        parts = [
+            f"CONVERSATION TURN: {self.turn_count}",
+            f"USER PREFERENCES: {self.user_preferences}",
+        ]
+
+        if self._cart:
+            # Cap what goes into the prompt: the model doesn't need the whole
+            # cart enumerated to pick the next dish, and tokens cost latency.
+            shown = list(self._cart.values())[-10:]
+            offset = len(self._cart) - len(shown)
+            parts.append(f"CURRENT SELECTION ({len(self._cart)} dishes):")
+            parts.extend(
+                f"{i}. {dish.display}" for i, dish in enumerate(shown, offset + 1)
+            )
+            if offset:
+                parts.append(f"(+{offset} more dishes already selected)")
+
         if self.conversation_history:
-            context += "RECENT CONVERSATION:\n"
-            for msg in self.conversation_history[-3:]:
-                if msg["role"] == "user":
-                    context += f"User: {msg['content']}\n"
-                    
-        return context
+            parts.append("RECENT CONVERSATION:")
+            parts.extend(
+                f"User: {msg.content}"
+                for msg in list(self.conversation_history)[-3:]
+                if msg.role == "user"
+            )
+
+        self._context_cache = "\n".join(parts) + "\n"
+        return self._context_cache
 
 class SupraMultiSearchEngine:
     """Simplified conversational S.U.P.R.A. agent - let AI handle everything."""
-    
+
+    # Shared across engine instances: a burst of concurrent turns queues
+    # here instead of opening unbounded sockets and tripping rate limits.
+    _gemini_semaphore = asyncio.Semaphore(int(os.getenv("SUPRA_MAX_CONCURRENCY", "16")))
+    # Generous upper bound covering the full retry/backoff sequence — a
+    # stalled call must not hold a semaphore slot forever.
+    _gemini_timeout = float(os.getenv("SUPRA_GEMINI_TIMEOUT", "90"))
+
     def __init__(self, model: str = "gemini-2.0-flash"):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY not found. Please set it in your .env file.")
-        
-        self.client = genai.Client(api_key=self.api_key)
+        self.client = get_client()
         self.model = model
         self.restaurant_data = []
+        self._restaurant_data_json = "[]"
+        self._catalog_compact = ""
+        self._dish_index = None
+        self._cached_catalog = None
+        # Keyed on (query similarity, state digest): a repeat question only
+        # hits when the cart/exclusions haven't changed since the answer.
+        self._semantic_cache = SemanticCache()
+        # Exact-repeat answers, keyed on (query, state digest). Checked
+        # before the similarity scan; LRU-bounded.
+        self._exact_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Same dish photo referenced across follow-up turns → reuse the
+        # prepared Part instead of re-reading the file. Keyed on mtime so an
+        # edited file invalidates its entry.
+        self._image_part_cache: Dict[tuple, types.Part] = {}
+        # Rendered static prompt prefix per limit value (limit is the only
+        # variable inside the instruction body).
+        self._static_prefix: Dict[int, str] = {}
         self.conversation = ConversationState()
 
     def load_data(self, data_path: str = "data/rests.json"):
         """Loads restaurant data from a JSON file."""
         try:
-            with open(data_path, 'r', encoding='utf-8') as file:
-                self.restaurant_data = json.load(file)
+            # The file itself is the serialized form — keep it instead of
+            # round-tripping the parsed data back through a dumps call.
+            # Parse and index are shared process-wide across engines.
+            mtime_ns = os.stat(data_path).st_mtime_ns
+            (self._restaurant_data_json, self.restaurant_data,
+             self._dish_index, self._catalog_compact) = _load_catalog(data_path, mtime_ns)
+            self._create_catalog_cache()
             print(f"✅ Successfully loaded {len(self.restaurant_data)} restaurants.")
             return True
         except Exception as e:
             print(f"❌ Failed to load data from {data_path}: {e}")
             return False
 
-    def _process_image(self, image_path: str) -> types.Part:
-        """Helper to read and prepare an image file for the API."""
-        # Read local image file
-        with open(image_path, 'rb') as image_file:
-            image_data = image_file.read()
-        
-        return types.Part.from_bytes(
-            data=image_data,
-            mime_type='image/jpeg'
-        )
+    async def load_data_async(self, data_path: str = "data/rests.json"):
+        """Async wrapper around load_data for use inside a running loop.
+
+        The read + parse + index build can take visible time on a large
+        catalog; running it in a worker thread keeps concurrent chat
+        coroutines responsive during a reload.
+        """
+        return await asyncio.to_thread(self.load_data, data_path)
+
+    def _create_catalog_cache(self):
+        """Uploads the catalog once as Gemini cached content so each turn
+        sends only the conversation delta instead of re-tokenizing the
+        whole menu server-side. Falls back to inlining on any failure
+        (small catalogs are below the API's minimum cached token count)."""
+        self._cached_catalog = None
+        try:
+            self._cached_catalog = self.client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    contents=[
+                        "RESTAURANT DATA (one dish per line as restaurant_id|restaurant_name|dish_name|price):\n"
+                        f"{self._catalog_compact}"
+                    ],
+                    ttl="3600s"
+                )
+            )
+        except Exception:
+            self._cached_catalog = None
+
+    @staticmethod
+    def _read_file_bytes(path: str) -> bytes:
+        with open(path, 'rb') as file:
+            return file.read()
+
+    async def _process_image(self, image_path: str) -> types.Part:
+        """Read and prepare an image file for the API without blocking the loop."""
+        cache_key = (image_path, os.path.getmtime(image_path))
+        part = self._image_part_cache.get(cache_key)
+        if part is not None:
+            return part
+
+        # Disk read happens in a worker thread so concurrent chat turns keep
+        # flowing; the content digest dedupes identical bytes reached through
+        # different paths or touched mtimes.
+        image_data = await asyncio.to_thread(self._read_file_bytes, image_path)
+        content_key = hashlib.blake2b(image_data, digest_size=16).digest()
+        part = self._image_part_cache.get(content_key)
+        if part is None:
+            part = types.Part.from_bytes(
+                data=image_data,
+                mime_type='image/jpeg'
+            )
+            self._image_part_cache[content_key] = part
+        if len(self._image_part_cache) >= 64:
+            self._image_part_cache.pop(next(iter(self._image_part_cache)))
+        self._image_part_cache[cache_key] = part
+        return part
         
     def _detect_satisfaction(self, user_input: str) -> bool:
         """Detect if user is satisfied."""
-        satisfaction_indicators = [
-            "perfect, thank you", "that's perfect", "perfect thanks", 
-            "i'm satisfied", "that's all", "i'm done", "that's enough",
-            "order these", "i'll order these", "book these"
-        ]
-        
-        user_input_lower = user_input.lower().strip()
-        return any(indicator in user_input_lower for indicator in satisfaction_indicators)
+        # casefold() is the Unicode-correct lowering (matters for the mixed
+        # Georgian/Latin input we get) and is computed exactly once per turn.
+        normalized = user_input.casefold().strip()
+        if normalized in _EXACT_SATISFY:
+            return True
+        return bool(_SATISFACTION_RE.search(normalized))
 
     async def chat(self, user_input: str, image_path: str = "", limit: int = 10) -> Dict[str, Any]:
         """
@@ -126,7 +532,7 @@ class SupraMultiSearchEngine:
                 "final_selection": {
                     "dishes": self.conversation.selected_dishes,
                     "total_dishes": len(self.conversation.selected_dishes),
-                    "total_cost": sum(d["dish_price"] for d in self.conversation.selected_dishes)
+                    "total_cost": self.conversation.total_cost
                 }
             }
         
@@ -143,7 +549,7 @@ class SupraMultiSearchEngine:
                 return {
                     "status": "success",
                     "data": result["data"],
-                    "conversation_complete": False,
+                    "conversation_complete": self.conversation.is_satisfied,
                     "conversation_state": {
                         "turn_count": self.conversation.turn_count,
                         "total_dishes": len(self.conversation.selected_dishes)
@@ -155,173 +561,302 @@ class SupraMultiSearchEngine:
         except Exception as e:
             return {"status": "error", "message": str(e), "conversation_complete": False}
 
+    async def chat_many(self, requests: List[Dict[str, Any]], limit: int = 10) -> Dict[str, Any]:
+        """Answer several independent queries with a single model call.
+
+        Each request is a dict with "id" and "query". Packing them into one
+        prompt pays the catalog tokens once instead of once per query —
+        useful for warm-up sweeps and batch evaluation. Stateless: the
+        per-session conversation is not touched.
+
+        Returns a mapping of request id to that request's result object.
+        """
+        if not requests:
+            return {}
+
+        restaurant_block = (
+            "RESTAURANT DATA (one dish per line as restaurant_id|restaurant_name|dish_name|price):\n"
+            f"{self._catalog_compact or self._restaurant_data_json}"
+        )
+        prompt = _BATCH_PROMPT.substitute(
+            restaurant_block=restaurant_block,
+            limit=limit,
+            requests_block=json_dumps(
+                [{"id": str(r.get("id", i)), "query": r.get("query", "")}
+                 for i, r in enumerate(requests)]
+            ),
+        )
+
+        try:
+            async with self._gemini_semaphore:
+                response = await asyncio.wait_for(
+                    retry_async(
+                        self.client.aio.models.generate_content,
+                        model=self.model,
+                        contents=[prompt],
+                        config=types.GenerateContentConfig(
+                            response_mime_type="application/json",
+                            temperature=0.1,
+                            max_output_tokens=8000
+                        )
+                    ),
+                    timeout=self._gemini_timeout
+                )
+
+            answers = json_loads(response.text)
+            return {str(entry.get("id")): entry for entry in answers}
+
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def search_variants(self, query: str, image_paths: List[str], limit: int = 10) -> Dict[str, Any]:
+        """Search against several images at once and merge the results.
+
+        Each image costs a full model round trip, so running them serially
+        multiplies user-visible latency by the number of images; gather
+        overlaps the network waits instead. The merged, deduplicated
+        selection replaces whatever the individual calls wrote to the cart.
+        """
+        results = await asyncio.gather(
+            *(self._process_with_ai(query, path, limit) for path in image_paths)
+        )
+        merged: List[Dict[str, Any]] = []
+        seen: set = set()
+        for result in results:
+            if result.get("status") != "success":
+                continue
+            for dish_data in result["data"].get("results", ()):
+                key = _dish_key(dish_data.get("restaurant_name", ""),
+                                dish_data.get("dish_name", ""))
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(dish_data)
+        merged = merged[:limit]
+        self.conversation.update_selected_dishes(merged)
+        return {"status": "success", "data": {"results": merged}}
+
+    async def _generate_chat_response(self, contents, config_kwargs):
+        """One rate-limited, bounded, retried non-streaming model call."""
+        async with self._gemini_semaphore:
+            return await asyncio.wait_for(
+                retry_async(
+                    self.client.aio.models.generate_content,
+                    model=self.model,
+                    contents=contents,
+                    config=types.GenerateContentConfig(**config_kwargs)
+                ),
+                timeout=self._gemini_timeout
+            )
+
     async def _process_with_ai(self, query: str, image_path: str = "", limit: int = 10) -> Dict[str, Any]:
         """
         Let AI handle ALL logic - additions, removals, filtering, everything.
         """
-        contents = []
-        
+        state_digest = hashlib.blake2b(
+            json.dumps([sorted(self.conversation.excluded_dishes),
+                        sorted(self.conversation._cart), limit]).encode(),
+            digest_size=8
+        ).hexdigest()
+        if not image_path:
+            exact_key = hashlib.blake2b(
+                f"{query}\x00{state_digest}".encode(), digest_size=16
+            ).hexdigest()
+            cached = self._exact_cache.get(exact_key)
+            if cached is None:
+                cached = self._semantic_cache.get(query, state_digest)
+            else:
+                self._exact_cache.move_to_end(exact_key)
+            if cached is not None:
+                self.conversation.turn_count += 1
+                self.conversation.update_selected_dishes(cached.get("results", []))
+                return {"status": "success", "data": cached}
+
         try:
-            restaurant_data_json = json.dumps(self.restaurant_data, ensure_ascii=False)
-            conversation_context = self.conversation.get_conversation_context()
-            
-            # Handle image if provided
-            if image_path:
-                image_part = self._process_image(image_path)
-                contents.append(image_part)
-            
-            # Current selection as JSON for AI to work with
-            current_selection_json = json.dumps(self.conversation.selected_dishes, ensure_ascii=False)
+            contents, config_kwargs = await self._build_chat_request(query, image_path, limit)
 
-            full_prompt = f"""
-            You are a professional Georgian cuisine expert and waiter with PERFECT MEMORY.
-            
-            {conversation_context}
-            
-            USER REQUEST: "{query}"
-            
-            CURRENT USER SELECTION (what they have now):
-            {current_selection_json}
-            
-            RESTAURANT DATA (available dishes):
-            {restaurant_data_json}
+            try:
+                response = await self._generate_chat_response(contents, config_kwargs)
+            except Exception as call_error:
+                # The server-side catalog cache lapses after its TTL, and the
+                # API then rejects the dead handle with a non-retryable error
+                # on every call. Drop the handle and rerun this turn with the
+                # catalog inlined instead of erroring until the session ends.
+                if self._cached_catalog is None or isinstance(call_error, asyncio.TimeoutError):
+                    raise
+                self._cached_catalog = None
+                contents, config_kwargs = await self._build_chat_request(query, image_path, limit)
+                response = await self._generate_chat_response(contents, config_kwargs)
 
-            INSTRUCTIONS - Handle ALL operations naturally:
-            
-            {"🖼️ IMAGE ANALYSIS MODE:" if image_path else ""}
-            {"- First, analyze the food image to identify what dish/cuisine it shows" if image_path else ""}
-            {"- Then, search the restaurant database for ACTUAL similar dishes" if image_path else ""}
-            {"- Return matching dishes from the database, not just description" if image_path else ""}
-            {"- Focus on finding real dishes that match what you see in the image" if image_path else ""}
-            
-            1. UNDERSTAND the user's intent:
-               - Adding dishes? ("add", "also", "more", "suggest")
-               - Removing/filtering? ("only", "just", "don't want", "remove", "except")
-               - Replacing? ("instead", "different")
-               - Asking for information? ("show", "what do I have")
-               - Image search? (when image provided, find similar dishes in database)
-            
-            2. HANDLE USER SELECTION DECISIONS:
-                - If user says "ავიღებ X" or "X ავიღებ" (I'll take X) = choose ONLY X, remove other similar options
-               - If user wants to ADD: keep current dishes + add new ones = - ALWAYS keep dishes user has already chosen (unless they specifically ask to remove)
-               - If user asks for new category: show ALL options in that category + keep existing selection
-               - If user says "I don't want X": remove X from current selection - Only remove items when user explicitly says "remove X" or "I don't want X"
-               - If user has allergies: remove/avoid allergens
-               - If IMAGE PROVIDED: search database for dishes similar to what's shown
-               - If user chooses 1 item from multiple options (like "საქონლის ხინკალს" from 4 khinkali)
-                - Keep the chosen item + remove other similar items from same category
-            
-            3. SHOW ALL AVAILABLE OPTIONS for what user requests - and after filtering RETURN FINAL COMPLETE SELECTION
-               - If user asks for khinkali, show ALL khinkali options available
-               - If user asks for drinks, show ALL drink options available  
-               - If user asks for meat dishes, show ALL meat dish options
-               - Don't make filtering decisions for the user - show options
-               - Only filter when user explicitly says "remove X" or "only keep Y"
-               - Maximum {limit} dishes total
-               - NEVER add duplicates - always check! if exact same dish already exists in selection
-                - If user selects existing dish, just keep that one, don't add again
-               - Respect allergies and preferences
-               - For images: MUST include actual matching dishes from database
-            
-            4. BE SMART about context:
-               - "only khinkali" = keep only khinkali dishes from current selection
-               - "I have pork allergy" = remove all pork dishes
-               - "add drinks" = add drinks to existing selection
-               - "remove everything except beef khinkali" = keep only beef khinkali
-               - IMAGE + "What food is this?" = identify AND find similar dishes in database
-               - if requested dish is not in the database and you can't find similar dishes, leave blank space for that dish
-
-            CRITICAL SELECTION RULES:
-                - "ხინკალი მინდა" = show ALL khinkali options (exploration phase)
-                - "საქონლის ხინკალს ავიღებ" = choose ONLY beef khinkali, REMOVE all other khinkali (selection phase)  
-                - "დავამატებ X" = choose X from shown options, remove other similar items
-                - "ავიღებ X" = same as above - selection, not addition
-
-                NEVER keep multiple items of same type after user makes a choice.
-
-            GEORGIAN LANGUAGE CONTEXT:
-                - "ხინკალი მინდა" = "I want khinkali" → Show options
-                - "ავიღებ ხინკალს" = "I'll take THE khinkali" → Use current selection
-                - When user says "ავიღებ X და Y" after discussing specific items → finalize those specific items, don't show all options again
-            
-            5. CRITICAL FOR IMAGES:
-               - Don't just describe the food - FIND MATCHING DISHES in the database
-               - Look for dishes with similar ingredients, cooking methods, or cuisine type
-               - Return actual available dishes, not descriptions
-            
-            <example>
-            EXAMPLE CONVERSATION TO FOLLOW:
-                User: "აჭარული ხაჭაპური მინდა" (I want Adjarian khachapuri)
-                → Show ALL available აჭარული ხაჭაპური options from all restaurants
-
-                User: "სახლი 11-ს აჭარული ავიღებ" (I'll take Adjarian from Sakhli #11)
-                → Keep that specific khachapuri remove other khachapuri options
-
-                User: "სასმელიც" (also drinks)  
-                → Keep the khachapuri selection + show ALL available drink options from the same restaurant user chose
-
-                User: "რამე ხორციანსაც" (something with meat too)
-                → Keep khachapuri from same restaurant + keep drinks + show ALL meat dish options
-
-                User: "აღარ მინდა სასმელი" (I don't want drinks)
-                → Keep khachapuri + remove drinks + show ALL meat dish options
-
-                User: "ვსო შევუკვეთავ" (I'll order these)
-                → Keep khachapuri + keep meat dishes + show final selection
-
-                This way user sees all options and makes their own filtering decisions.   
-            </example>
-
-            <example 2>
-                User: "ხინკალი მინდა" (I want khinkali)
-                → Show ALL 5 khinkali options
-
-                User: "საქონლის ხინკალს ავიღებ" (I'll take beef khinkali)  
-                → Keep ONLY "ხინკალი (საქონლის, 1 ცალი)" - remove other 4 khinkali options
-                → Final selection: 1 dish (the chosen beef khinkali)
-
-                User: "სასმელიც დავამატებ" (I'll also add drinks)
-                → Keep beef khinkali + show ALL drink options
-            </example 2>
-
-            OUTPUT FORMAT (JSON ONLY):
-            {{
-                "results": [
-                    {{
-                        "restaurant_id": "...",
-                        "restaurant_name": "...",
-                        "dish_name": "...",
-                        "dish_price": 0.00,
-                    }}
-                ],
-                "operation_performed": "added" | "filtered" | "replaced" | "removed" | "no_change"
-            }}
-            """
-            
-            contents.append(full_prompt)
+            result = json_loads(response.text)
+            # Dedupe and enforce the exclusion invariant in the same pass as
+            # the parse — the model is asked not to resurface rejected dishes,
+            # but we don't trust it, and the caller should never see them.
+            seen = set()
+            final_dishes = []
+            for dish_data in result.get("results", ()):
+                key = _dish_key(dish_data.get("restaurant_name", ""),
+                                dish_data.get("dish_name", ""))
+                if key in seen or key in self.conversation.excluded_dishes:
+                    continue
+                seen.add(key)
+                final_dishes.append(dish_data)
+            result["results"] = final_dishes
 
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                    temperature=0.1,
-                    max_output_tokens=4000
-                )
-            )
-            
-            result = json.loads(response.text)
-            final_dishes = result.get("results", [])
-            
             # Update our state with AI's final selection
             self.conversation.turn_count += 1
             self.conversation.update_selected_dishes(final_dishes)
-            
+            # The model classifies satisfaction as part of the same call, so
+            # phrasings the keyword fast path misses still close the order
+            # without an extra round trip.
+            if result.get("conversation_state") == "satisfied":
+                self.conversation.is_satisfied = True
+            if not image_path:
+                self._semantic_cache.put(query, result, state_digest)
+                self._exact_cache[exact_key] = result
+                if len(self._exact_cache) > 256:
+                    self._exact_cache.popitem(last=False)
+
             return {"status": "success", "data": result}
 
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    async def chat_stream(self, user_input: str, image_path: str = "", limit: int = 10):
+        """Streamed variant of chat: yields each dish dict the moment its
+        JSON object closes in the model output, so the UI can render results
+        while the rest of the response is still decoding. Conversation state
+        is reconciled once the stream ends."""
+        if not user_input.strip():
+            return
+
+        if self._detect_satisfaction(user_input):
+            self.conversation.is_satisfied = True
+            return
+
+        if self.conversation.turn_count == 0:
+            self.conversation.initial_query = user_input
+        self.conversation.add_user_message(user_input)
+
+        contents, config_kwargs = await self._build_chat_request(user_input, image_path, limit)
+
+        parser = ResultStreamParser()
+        final_dishes: List[Dict[str, Any]] = []
+        seen: set = set()
+        completed = False
+        try:
+            async with self._gemini_semaphore:
+                try:
+                    stream = await self._open_chat_stream(contents, config_kwargs)
+                except Exception:
+                    # Same dead-handle recovery as the blocking path: a lapsed
+                    # catalog cache must not kill streaming for the session.
+                    if self._cached_catalog is None:
+                        raise
+                    self._cached_catalog = None
+                    contents, config_kwargs = await self._build_chat_request(user_input, image_path, limit)
+                    stream = await self._open_chat_stream(contents, config_kwargs)
+                chunks = stream.__aiter__()
+                while True:
+                    # Bound each chunk wait so a stalled stream can't hold a
+                    # semaphore slot forever.
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self._gemini_timeout)
+                    except StopAsyncIteration:
+                        break
+                    if not chunk.text:
+                        continue
+                    for dish_data in parser.feed(chunk.text):
+                        key = _dish_key(dish_data.get("restaurant_name", ""),
+                                        dish_data.get("dish_name", ""))
+                        if key in seen or key in self.conversation.excluded_dishes:
+                            continue
+                        seen.add(key)
+                        final_dishes.append(dish_data)
+                        yield dish_data
+            completed = True
+        finally:
+            # Reconcile even when the stream dies mid-reply: dishes already
+            # yielded to the UI belong in the cart. A stream that produced
+            # nothing leaves the previous selection untouched.
+            if completed or final_dishes:
+                self.conversation.turn_count += 1
+                self.conversation.update_selected_dishes(final_dishes)
+
+    async def _open_chat_stream(self, contents, config_kwargs):
+        """Open a streaming model call under the shared retry policy, so a
+        transient 429/503 at stream creation backs off instead of surfacing."""
+        return await retry_async(
+            self.client.aio.models.generate_content_stream,
+            model=self.model,
+            contents=contents,
+            config=types.GenerateContentConfig(**config_kwargs)
+        )
+
+    async def _build_chat_request(self, query: str, image_path: str = "", limit: int = 10):
+        """Assemble the contents list and generation config for one chat turn.
+
+        Shared between the blocking and streaming paths so the prompt logic
+        lives in exactly one place.
+        """
+        # Kick the image read off first so it overlaps the catalog/context
+        # assembly below instead of running after it.
+        image_task = asyncio.create_task(self._process_image(image_path)) if image_path else None
+
+        catalog_block = self._catalog_compact or self._restaurant_data_json
+        # Without a server-side catalog cache, shortlist the dishes that
+        # match the query instead of shipping the whole menu each turn.
+        # Image turns keep the full catalog — there's no text to match.
+        if self._cached_catalog is None and query and not image_path and self._dish_index is not None:
+            candidates = self._dish_index.top_k(query, k=max(50, limit * 3))
+            if len(candidates) >= limit:
+                catalog_block = _compact_lines(candidates)
+        conversation_context = self.conversation.get_conversation_context()
+
+        # Current selection as compact identity lines — the full records
+        # already live in the catalog block.
+        current_selection = self.conversation.selection_compact()
+
+        if self._cached_catalog is not None:
+            # Catalog lives server-side in the content cache.
+            restaurant_block = ""
+        else:
+            restaurant_block = (
+                "RESTAURANT DATA (one dish per line as restaurant_id|restaurant_name|dish_name|price):\n"
+                f"{catalog_block}"
+            )
+
+        # Static instruction prefix first (identical bytes turn over turn,
+        # so the provider's prefix cache can reuse its prefill), dynamic
+        # material and any image trailing it.
+        static_part = self._static_prefix.get(limit)
+        if static_part is None:
+            static_part = _CHAT_STATIC.substitute(limit=limit)
+            self._static_prefix[limit] = static_part
+
+        dynamic_part = _CHAT_DYNAMIC.substitute(
+            image_block=_IMAGE_MODE_BLOCK if image_path else "",
+            conversation_context=conversation_context,
+            query=query,
+            current_selection=current_selection,
+            restaurant_block=restaurant_block,
+        )
+
+        contents = [static_part, dynamic_part]
+        if image_task is not None:
+            contents.append(await image_task)
+
+        config_kwargs = {
+            "response_mime_type": "application/json",
+            "response_schema": SearchResponse,
+            "temperature": 0.1,
+            "max_output_tokens": 4000
+        }
+        if self._cached_catalog is not None:
+            config_kwargs["cached_content"] = self._cached_catalog.name
+
+        return contents, config_kwargs
+
     def start_new_conversation(self, preferences: str = ""):
         """Start a fresh conversation."""
         self.conversation = ConversationState()
@@ -333,7 +868,7 @@ class SupraMultiSearchEngine:
             "turn_count": self.conversation.turn_count,
             "selected_dishes": self.conversation.selected_dishes,
             "total_dishes": len(self.conversation.selected_dishes),
-            "total_cost": sum(d["dish_price"] for d in self.conversation.selected_dishes),
+            "total_cost": self.conversation.total_cost,
             "is_satisfied": self.conversation.is_satisfied
         }
 
@@ -1,9 +1,11 @@
 import google.generativeai as genai
-import json
+import hashlib
 from PIL import Image
 import os
 from dotenv import load_dotenv
 
+from agents.jsonutil import json_loads
+
 # --- Configuration ---
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -11,18 +13,26 @@ if not GOOGLE_API_KEY:
     raise ValueError("GOOGLE_API_KEY not found. Please set it in your .env file.")
 genai.configure(api_key=GOOGLE_API_KEY)
 
+# Model object construction validates config and sets up the HTTP client;
+# build it once at import and pass temperature per call instead.
+_MODEL = genai.GenerativeModel('gemini-1.5-flash')
+
+# Repeated extraction of the same menu text skips the API entirely.
+_TEXT_RESULT_CACHE: dict = {}
+
 # --- Internal Core AI Function ---
 def _generate_menu_json(content, temperature: float = 0.1):
     """
     Internal function that communicates with the Gemini model.
     It takes prepared content (Image or text) and returns structured JSON.
     """
-    generation_config = genai.types.GenerationConfig(temperature=temperature)
-    model = genai.GenerativeModel(
-        'gemini-1.5-flash',
-        generation_config=generation_config
-    )
-    
+    cache_key = None
+    if isinstance(content, str):
+        cache_key = (hashlib.blake2b(content.encode(), digest_size=16).digest(), temperature)
+        cached = _TEXT_RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
     prompt = """
     You are T.A.S.T.E. (Text and Semantic Tactical Extractor).
     Your task is to analyze the provided menu content and extract up to the first 10 dishes.
@@ -45,9 +55,18 @@ def _generate_menu_json(content, temperature: float = 0.1):
     """
     
     try:
-        response = model.generate_content([prompt, content])
-        cleaned_response = response.text.strip().replace("``````", "")
-        return json.loads(cleaned_response)
+        response = _MODEL.generate_content(
+            [prompt, content],
+            generation_config=genai.types.GenerationConfig(
+                temperature=temperature,
+                response_mime_type="application/json"
+            )
+        )
+        # JSON mode means no markdown fences to strip — parse directly.
+        result = json_loads(response.text)
+        if cache_key is not None:
+            _TEXT_RESULT_CACHE[cache_key] = result
+        return result
     except Exception as e:
         print(f"An error occurred while communicating with the AI model: {e}")
         return []
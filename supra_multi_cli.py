@@ -3,11 +3,33 @@ import argparse
 import json
 from agents.supra_multi import SupraMultiSearchEngine
 
+# uvloop is an optional drop-in event loop (~2-4x faster async I/O
+# scheduling); fall back to the stdlib loop when it isn't installed.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 class SupraMultiCLI:
     """Simple chat-style CLI for the conversational S.U.P.R.A. engine."""
     
     def __init__(self):
         self.engine = SupraMultiSearchEngine()
+        # name -> joined preferences, parsed once on first use.
+        self._user_prefs = None
+
+    def _get_user_preferences(self, user_name: str) -> str:
+        """Look up a user's preferences, parsing users.json only once."""
+        if self._user_prefs is None:
+            try:
+                with open('data/users.json', 'r') as f:
+                    users = json.load(f)
+                self._user_prefs = {u['name']: ', '.join(u['preferences']) for u in users}
+            except Exception as e:
+                print(f"Warning: Could not load user preferences: {e}")
+                self._user_prefs = {}
+        return self._user_prefs.get(user_name, "")
         
     def display_results(self, data: dict):
         """Display search results in a friendly format."""
@@ -49,7 +71,7 @@ class SupraMultiCLI:
             print(f"      💭 {result['reason']}")
         print()
 
-    async def run_chat(self, preferences: str = ""):
+    async def run_chat(self, preferences: str = "", stream: bool = False):
         """Run the chat interface."""
         
         # Load data
@@ -69,9 +91,11 @@ class SupraMultiCLI:
         print("=" * 60)
         
         while True:
-            # Get user input
+            # Get user input without blocking the event loop, so background
+            # tasks (cache warming, pending requests) keep running while the
+            # user types.
             try:
-                user_input = input("\n👤 You: ").strip()
+                user_input = (await asyncio.to_thread(input, "\n👤 You: ")).strip()
             except KeyboardInterrupt:
                 print("\n👋 Goodbye! Enjoy your meal!")
                 break
@@ -85,7 +109,28 @@ class SupraMultiCLI:
                 break
             
             print("🔍 Searching...")
-            
+
+            if stream:
+                # Print each dish the moment its JSON object closes instead
+                # of waiting for the full response.
+                count = 0
+                try:
+                    async for dish in self.engine.chat_stream(user_input):
+                        count += 1
+                        self._print_dish(count, dish)
+                except Exception as e:
+                    # Degrade like the non-stream branch: report the failure
+                    # and keep the session (and cart) alive.
+                    print(f"❌ Error: {e}")
+                    continue
+                if self.engine.conversation.is_satisfied:
+                    print("🤖 Perfect! Enjoy your meal!")
+                    print("\n🎉 Conversation completed!")
+                    break
+                if count == 0:
+                    print("🤖 No matching dishes found — try rephrasing.")
+                continue
+
             # Send to chat engine
             response = await self.engine.chat(user_input)
             
@@ -133,16 +178,7 @@ class SupraMultiCLI:
             
         # Load user preferences if user name provided
         if user_name:
-            try:
-                with open('data/users.json', 'r') as f:
-                    users = json.load(f)
-                    
-                for user in users:
-                    if user['name'] == user_name:
-                        preferences = ', '.join(user['preferences'])
-                        break
-            except Exception as e:
-                print(f"Warning: Could not load user preferences: {e}")
+            preferences = self._get_user_preferences(user_name) or preferences
         
         # Start conversation with preferences
         if preferences:
@@ -178,6 +214,8 @@ async def main():
     # TEST: Add image support (remove this line when done testing)
     parser.add_argument('-i', '--image', type=str, default="",
                        help="Path to image for visual food search")
+    parser.add_argument('-s', '--stream', action='store_true',
+                       help="Stream dishes as they arrive in chat mode")
     
     args = parser.parse_args()
     
@@ -193,7 +231,7 @@ async def main():
         )
     else:
         # Interactive chat mode
-        await cli.run_chat(preferences=args.preferences)
+        await cli.run_chat(preferences=args.preferences, stream=args.stream)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file